@@ -1,5 +1,5 @@
 """
-Módulo que implementa um worker para baixar múltiplos arquivos via rede sequencialmente,
+Módulo que implementa um worker para baixar múltiplos arquivos via rede em paralelo,
 emitindo sinais para monitoramento de progresso, conclusão e erros.
 
 Copyright (C) 2025 Markus Scheid Anater
@@ -11,8 +11,24 @@ Este programa é distribuído sob a licença GNU GPL v2 ou posterior.
 from qgis.PyQt.QtCore import QObject, QUrl, pyqtSignal, QTimer
 from qgis.PyQt.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
 import os
+import time
+from functools import partial
+
+# Tamanho máximo de cada bloco lido da resposta e gravado em disco (64 KiB)
+CHUNK_SIZE = 64 * 1024
+
+# Número máximo de downloads simultâneos
+MAX_CONCURRENT_DOWNLOADS = 4
+
+# Unidades de progresso atribuídas a cada arquivo em download_progress
+PROGRESS_UNITS_PER_FILE = 1000
+
+# Intervalo mínimo, em segundos, entre emissões de download_progress
+PROGRESS_INTERVAL = 0.1
 
 class DownloadWorker(QObject):
+    # download_progress emite (unidades concluídas, unidades totais) do lote
+    # inteiro, contando PROGRESS_UNITS_PER_FILE por arquivo
     started = pyqtSignal(str)
     file_started = pyqtSignal(str, int)
     download_progress = pyqtSignal(int, int)
@@ -25,92 +41,198 @@ class DownloadWorker(QObject):
         self.urls = urls
         self.dest_path = dest_path
         self.nam = QNetworkAccessManager()
-        self.current_index = 0
-        self.reply = None
+        self.next_index = 0
+        self.completed_files = 0
         self.total_urls = len(urls)
+        # URLs interpretadas uma única vez: requisições e nomes dos arquivos
+        qurls = [QUrl(url) for url in urls]
+        self._requests = [QNetworkRequest(qurl) for qurl in qurls]
+        self._file_names = [os.path.basename(qurl.path()) for qurl in qurls]
+        self._dest_paths = [os.path.join(dest_path, file_name) for file_name in self._file_names]
         self.zip_files_downloaded = []
         self._is_canceled = False
+        self._is_finished = False
+        self._last_progress_emit = 0.0
+        # Downloads em andamento, indexados pela QNetworkReply correspondente
+        self._inflight = {}
 
     def start(self):
         self.started.emit(f"Iniciando download de {self.total_urls} arquivos...")
-        QTimer.singleShot(0, self.download_next)
-
-    def cancel(self):
-        self._is_canceled = True
-        if self.reply is not None:
-            self.reply.abort()  # cancela o download ativo
-
-    def download_next(self):
-
-        if self._is_canceled:
+        if self.total_urls == 0:
             self.finished.emit(self.dest_path, self.zip_files_downloaded)
             return
-        if self.current_index >= self.total_urls:
+
+        # O diretório de destino é o mesmo para todos os arquivos
+        try:
+            os.makedirs(self.dest_path, exist_ok=True)
+        except OSError as e:
+            self.error.emit(f"Erro ao criar o diretório {self.dest_path}: {e}")
             self.finished.emit(self.dest_path, self.zip_files_downloaded)
             return
 
-        if self.current_index >= self.total_urls:
-            self.started.emit("Todos os downloads foram concluídos.")
-            self.finished.emit(self.dest_path, self.zip_files_downloaded)
+        for _ in range(min(MAX_CONCURRENT_DOWNLOADS, self.total_urls)):
+            QTimer.singleShot(0, self.download_next)
+
+    def cancel(self):
+        self._is_canceled = True
+        # cancela todos os downloads ativos
+        for reply in list(self._inflight):
+            reply.abort()
+
+    def download_next(self):
+        """Inicia o próximo download pendente, se houver."""
+        if self._is_canceled or self.next_index >= self.total_urls:
+            if not self._inflight and not self._is_finished:
+                self._is_finished = True
+                self.finished.emit(self.dest_path, self.zip_files_downloaded)
             return
 
-        url = self.urls[self.current_index]
-        file_name = os.path.basename(QUrl(url).path())
-        self.file_started.emit(file_name, self.current_index)
+        index = self.next_index
+        self.next_index += 1
 
-        request = QNetworkRequest(QUrl(url))
-        self.reply = self.nam.get(request)
+        url = self.urls[index]
+        file_name = self._file_names[index]
+        self.file_started.emit(file_name, index)
 
-        self.reply.downloadProgress.connect(self.handle_download_progress)
-        self.reply.finished.connect(self.handle_finished)
-        self.reply.errorOccurred.connect(self.handle_error)
-        self.reply.sslErrors.connect(lambda errors: self.error.emit(f"Erro SSL: {errors}"))
+        # Abre o arquivo de destino antes da requisição para gravar os dados
+        # conforme chegam, sem acumular o ZIP inteiro em memória
+        zip_path = self._dest_paths[index]
+        try:
+            fh = open(zip_path, 'wb')
+        except OSError as e:
+            self.error.emit(f"Erro ao criar o arquivo {file_name}: {e}")
+            self.completed_files += 1
+            self.emit_progress()
+            self.file_finished.emit()
+            QTimer.singleShot(0, self.download_next)
+            return
 
-    def handle_download_progress(self, bytes_received, bytes_total):
+        reply = self.nam.get(self._requests[index])
+        self._inflight[reply] = {
+            "url": url,
+            "zip_path": zip_path,
+            "fh": fh,
+            "write_failed": False,
+            "bytes_received": 0,
+            "bytes_total": 0,
+        }
+
+        reply.readyRead.connect(partial(self._drain, reply))
+        reply.downloadProgress.connect(partial(self.handle_download_progress, reply))
+        reply.finished.connect(partial(self._on_reply_finished, reply))
+        reply.errorOccurred.connect(partial(self.handle_error, reply))
+        reply.sslErrors.connect(self.handle_ssl_errors)
+
+    def handle_download_progress(self, reply, bytes_received, bytes_total):
         if self._is_canceled:
-            if self.reply is not None:
-                self.reply.abort()
+            reply.abort()
             return
-        if bytes_total > 0:
-            self.download_progress.emit(bytes_received, bytes_total)
-
-    def handle_finished(self):
-        if self.reply.error() != QNetworkReply.NoError:
-            # O erro já foi tratado em handle_error
-            self.cleanup_and_continue()
+        transfer = self._inflight.get(reply)
+        if transfer is None or bytes_total <= 0:
             return
+        transfer["bytes_received"] = bytes_received
+        transfer["bytes_total"] = bytes_total
 
+        # Limita as atualizações da interface; a conclusão de um arquivo é sempre emitida
+        now = time.monotonic()
+        if now - self._last_progress_emit < PROGRESS_INTERVAL and bytes_received < bytes_total:
+            return
+        self._last_progress_emit = now
+        self.emit_progress()
+
+    def emit_progress(self):
+        """
+        Emite o progresso do lote: arquivos concluídos mais a fração já
+        recebida de cada download em andamento.
+        """
+        in_progress = sum(
+            t["bytes_received"] / t["bytes_total"]
+            for t in self._inflight.values()
+            if t["bytes_total"] > 0
+        )
+        current = int((self.completed_files + in_progress) * PROGRESS_UNITS_PER_FILE)
+        total = self.total_urls * PROGRESS_UNITS_PER_FILE
+        self.download_progress.emit(current, total)
+
+    def handle_ssl_errors(self, errors):
+        self.error.emit(f"Erro SSL: {errors}")
+
+    def _drain(self, reply):
+        """Grava no arquivo de destino os blocos disponíveis na resposta."""
+        transfer = self._inflight.get(reply)
+        if transfer is None or transfer["fh"] is None:
+            return
+        fh = transfer["fh"]
         try:
-            data = self.reply.readAll()
-            zip_name = os.path.basename(self.urls[self.current_index])
-            zip_path = os.path.join(self.dest_path, zip_name)
-
-            os.makedirs(os.path.dirname(zip_path), exist_ok=True)
-
-            with open(zip_path, 'wb') as f:
-                f.write(data.data())  # usa .data() para evitar problemas com QByteArray
-
-            self.zip_files_downloaded.append(zip_path)
-            self.started.emit(f"Arquivo salvo com sucesso: {zip_name}")
-        except Exception as e:
+            available = reply.bytesAvailable()
+            while available > 0:
+                # O bloco lido já expõe o protocolo de buffer: é gravado sem
+                # uma cópia intermediária para bytes
+                fh.write(reply.read(min(available, CHUNK_SIZE)))
+                available = reply.bytesAvailable()
+        except OSError as e:
+            # Falha de escrita (ex.: disco cheio): descarta o arquivo e
+            # interrompe o download em vez de continuar recebendo dados
+            zip_name = os.path.basename(transfer["zip_path"])
             self.error.emit(f"Erro ao salvar o arquivo {zip_name}: {e}")
-        
-        self.cleanup_and_continue()
+            transfer["write_failed"] = True
+            self.discard_file(transfer)
+            reply.abort()
 
-    def handle_error(self, code):
+    def _on_reply_finished(self, reply):
+        transfer = self._inflight.get(reply)
+        if transfer is None:
+            return
+        zip_name = os.path.basename(transfer["zip_path"])
+
+        if self._is_canceled or reply.error() != QNetworkReply.NoError:
+            # O erro já foi tratado em handle_error ou em _drain
+            self.discard_file(transfer)
+        else:
+            self._drain(reply)
+            if not transfer["write_failed"]:
+                try:
+                    transfer["fh"].close()
+                    transfer["fh"] = None
+                    self.zip_files_downloaded.append(transfer["zip_path"])
+                    self.started.emit(f"Arquivo salvo com sucesso: {zip_name}")
+                except OSError as e:
+                    self.error.emit(f"Erro ao salvar o arquivo {zip_name}: {e}")
+                    transfer["fh"] = None
+                    self.discard_file(transfer)
+
+        self.cleanup_and_continue(reply)
+
+    def discard_file(self, transfer):
+        """Fecha e remove o arquivo parcial de um download."""
+        if transfer["fh"] is not None:
+            try:
+                transfer["fh"].close()
+            except OSError:
+                # O arquivo será removido; falhas ao descarregar o buffer não importam
+                pass
+            transfer["fh"] = None
+        if os.path.exists(transfer["zip_path"]):
+            os.remove(transfer["zip_path"])
+
+    def handle_error(self, reply, code):
         if self._is_canceled:
-            # Pode emitir uma mensagem específica ou ignorar
-            self.finished.emit(self.dest_path, self.zip_files_downloaded)
+            # O cancelamento é finalizado em _on_reply_finished
             return
-        url = self.urls[self.current_index]
-        err_msg = f"Erro ao baixar {url} ({self.reply.errorString()})"
+        transfer = self._inflight.get(reply)
+        if transfer is not None and transfer["write_failed"]:
+            # O download foi abortado por _drain, que já emitiu o erro
+            return
+        url = transfer["url"] if transfer is not None else reply.url().toString()
+        err_msg = f"Erro ao baixar {url} ({reply.errorString()})"
         self.error.emit(err_msg)
-        self.cleanup_and_continue()
-
-    def cleanup_and_continue(self):
-        if self.reply:
-            self.reply.deleteLater()
-            self.reply = None
+        # O sinal finished é sempre emitido após errorOccurred; a limpeza e o
+        # início do próximo download ficam a cargo de _on_reply_finished
+
+    def cleanup_and_continue(self, reply):
+        self._inflight.pop(reply, None)
+        reply.deleteLater()
+        self.completed_files += 1
+        self.emit_progress()
         self.file_finished.emit()
-        self.current_index += 1
         QTimer.singleShot(0, self.download_next)
@@ -13,11 +13,13 @@ from qgis.core import (
     QgsCoordinateTransform,
     QgsCoordinateReferenceSystem,
     QgsProject,
-    QgsRasterLayer
+    QgsRasterLayer,
+    QgsSpatialIndex,
+    QgsFeatureRequest,
+    QgsRectangle
 )
 
-from collections import defaultdict
-from itertools import product
+from collections import defaultdict, namedtuple
 import os
 import csv
 import urllib.request
@@ -37,15 +39,104 @@ DIC_SUFFIX_DESC = {
 
 BASE_URL_TOPODATA = 'http://www.dsr.inpe.br/topodata/data/geotiff/'
 
-def is_valid_polygon(polygon_path: str) -> bool:
-    target_crs = QgsCoordinateReferenceSystem("EPSG:4674")
+# SIRGAS 2000 (EPSG:4674), CRS de referência da grade do Topodata
+TARGET_CRS = QgsCoordinateReferenceSystem.fromEpsgId(4674)
+
+def crs_transform(src_crs, dest_crs):
+    """
+    Retorna a transformação entre dois CRS, ou None se forem o mesmo CRS.
+
+    A transformação é criada a cada chamada para respeitar o contexto de
+    transformação atual do projeto.
+    """
+    src_authid = src_crs.authid()
+    dest_authid = dest_crs.authid()
+    if src_authid and dest_authid:
+        if src_authid == dest_authid:
+            return None
+    elif src_crs == dest_crs:
+        # CRS personalizado, sem authid
+        return None
+    return QgsCoordinateTransform(src_crs, dest_crs, QgsProject.instance())
 
+
+def is_valid_polygon(polygon_path: str) -> bool:
     # Carrega a camada.
     polygon_layer = QgsVectorLayer(polygon_path, "polygon", "ogr")
     
     return polygon_layer.isValid()
 
 
+def extent_in_crs(layer, crs):
+    """
+    Retorna a extensão da camada, reprojetada para o CRS informado se necessário.
+    """
+    extent = layer.extent()
+    transform = crs_transform(layer.crs(), crs)
+    if transform:
+        extent = transform.transformBoundingBox(extent)
+    return extent
+
+
+def build_grid_index(grid_layer, transform=None, request=None):
+    """
+    Constrói um índice espacial sobre as feições não vazias da grade.
+
+    Args:
+        grid_layer (QgsVectorLayer): Camada da grade.
+        transform (QgsCoordinateTransform, opcional): Transformação aplicada
+            às geometrias da grade antes da indexação.
+        request (QgsFeatureRequest, opcional): Filtro espacial e de atributos
+            repassado ao provedor na leitura da grade.
+
+    Returns:
+        tuple: Índice espacial (QgsSpatialIndex) e dicionário {id: feição} da grade.
+    """
+    grid_index = QgsSpatialIndex()
+    grid_features = {}
+
+    for grid_feat in grid_layer.getFeatures(request or QgsFeatureRequest()):
+        grid_geom = grid_feat.geometry()
+        if not grid_geom or grid_geom.isEmpty():
+            continue
+        if transform:
+            grid_geom.transform(transform)
+            grid_feat.setGeometry(grid_geom)
+        grid_index.addFeature(grid_feat)
+        grid_features[grid_feat.id()] = grid_feat
+
+    return grid_index, grid_features
+
+
+def is_covered_by_tiles(geom, grid_index, grid_features):
+    """
+    Verifica se uma geometria está totalmente coberta pelos tiles da grade.
+
+    Apenas os tiles cujo retângulo envolvente intersecta a geometria são
+    considerados; a união só é calculada quando nenhum tile isolado a contém.
+
+    Args:
+        geom (QgsGeometry): Geometria a ser testada.
+        grid_index (QgsSpatialIndex): Índice espacial da grade.
+        grid_features (dict): Dicionário {id: feição} da grade.
+
+    Returns:
+        bool: True se a geometria estiver totalmente coberta, False caso contrário.
+    """
+    candidates = [
+        grid_features[grid_id].geometry()
+        for grid_id in grid_index.intersects(geom.boundingBox())
+    ]
+    if not candidates:
+        return False
+
+    for grid_geom in candidates:
+        if grid_geom.contains(geom):
+            return True
+
+    return QgsGeometry.unaryUnion(candidates).contains(geom)
+
+
 def is_polygon_within_grid(polygon_path: str, grid_path: str) -> bool:
     """
     Verifica se a camada de polígono está totalmente contida na camada de grade,
@@ -58,9 +149,6 @@ def is_polygon_within_grid(polygon_path: str, grid_path: str) -> bool:
     Returns:
         bool: True se o polígono estiver totalmente contido, False caso contrário.
     """
-    # Define o CRS de destino como SIRGAS 2000 (EPSG:4674)
-    target_crs = QgsCoordinateReferenceSystem("EPSG:4674")
-
     # 1. Carrega as camadas e valida se são válidas.
     polygon_layer = QgsVectorLayer(polygon_path, "polygon", "ogr")
     grid_layer = QgsVectorLayer(grid_path, "grid", "ogr")
@@ -70,52 +158,38 @@ def is_polygon_within_grid(polygon_path: str, grid_path: str) -> bool:
     if not grid_layer.isValid():
         raise ValueError(f"Camada de grade inválida: {grid_path}")
     
-    # 2. Processa a camada de grade: reprojeta e combina as geometrias.
-    grid_geom = QgsGeometry()
+    # 2. Indexa a camada de grade, reprojetando-a se necessário.
     grid_crs = grid_layer.crs()
+    grid_transform = crs_transform(grid_crs, TARGET_CRS)
 
-    if grid_crs != target_crs:
-        print(f"Reprojetando a camada de grade do CRS {grid_crs.authid()} para {target_crs.authid()}...")
-        transform = QgsCoordinateTransform(grid_crs, target_crs, QgsProject.instance())
-        
-        for feat in grid_layer.getFeatures():
-            geom = feat.geometry()
-            if not geom.isNull():
-                geom.transform(transform)
-                if grid_geom.isNull():
-                    grid_geom = geom
-                else:
-                    grid_geom = grid_geom.combine(geom)
-    else:
-        for feat in grid_layer.getFeatures():
-            geom = feat.geometry()
-            if not geom.isNull():
-                if grid_geom.isNull():
-                    grid_geom = geom
-                else:
-                    grid_geom = grid_geom.combine(geom)
-
-    if grid_geom.isNull():
+    if grid_transform:
+        print(f"Reprojetando a camada de grade do CRS {grid_crs.authid()} para {TARGET_CRS.authid()}...")
+
+    # Lê apenas as geometrias dos tiles na extensão da camada de polígono
+    request = QgsFeatureRequest()
+    request.setFilterRect(extent_in_crs(polygon_layer, grid_crs))
+    request.setNoAttributes()
+
+    grid_index, grid_features = build_grid_index(grid_layer, grid_transform, request)
+
+    if not grid_features:
         return False
-        
+
     # 3. Itera sobre cada polígono da camada de entrada: reprojeta e verifica a contenção.
     polygon_crs = polygon_layer.crs()
-    
-    if polygon_crs != target_crs:
-        print(f"Reprojetando a camada de polígono do CRS {polygon_crs.authid()} para {target_crs.authid()}...")
-        transform = QgsCoordinateTransform(polygon_crs, target_crs, QgsProject.instance())
-        
-        for feat in polygon_layer.getFeatures():
-            polygon_geom = feat.geometry()
-            if not polygon_geom.isNull():
-                polygon_geom.transform(transform)
-                if not polygon_geom.within(grid_geom):
-                    return False
-    else:
-        for feat in polygon_layer.getFeatures():
-            polygon_geom = feat.geometry()
-            if not polygon_geom.isNull() and not polygon_geom.within(grid_geom):
-                return False
+    transform = crs_transform(polygon_crs, TARGET_CRS)
+
+    if transform:
+        print(f"Reprojetando a camada de polígono do CRS {polygon_crs.authid()} para {TARGET_CRS.authid()}...")
+
+    for feat in polygon_layer.getFeatures():
+        polygon_geom = feat.geometry()
+        if polygon_geom.isNull():
+            continue
+        if transform:
+            polygon_geom.transform(transform)
+        if not is_covered_by_tiles(polygon_geom, grid_index, grid_features):
+            return False
 
     # Se todas as feições foram verificadas e estão contidas, retorna True.
     return True
@@ -143,14 +217,19 @@ def analyze_polygon_against_grid(polygon_path, grid_path):
         raise Exception(f"Camada de grade inválida: {grid_path}")
 
     # Verifica e aplica transformação de CRS se necessário
-    if poly_layer.crs() != grid_layer.crs():
-        transform = QgsCoordinateTransform(poly_layer.crs(), grid_layer.crs(), QgsProject.instance())
-    else:
-        transform = None
+    transform = crs_transform(poly_layer.crs(), grid_layer.crs())
 
-    results = []
+    # Resolve o índice do campo 'tile_code' uma única vez
+    tile_code_idx = grid_layer.fields().indexOf("tile_code")
+    if tile_code_idx < 0:
+        raise Exception("Campo 'tile_code' não encontrado na camada da grade")
 
-    for poly_feat in poly_layer.getFeatures():
+    # Reprojeta e prepara cada polígono uma única vez. As geometrias são
+    # mantidas na lista pois os motores preparados as referenciam.
+    polygons = []
+    poly_extent = QgsRectangle()
+
+    for poly_feat in poly_layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
         poly_geom = poly_feat.geometry()
         if not poly_geom or poly_geom.isEmpty():
             continue
@@ -158,52 +237,66 @@ def analyze_polygon_against_grid(polygon_path, grid_path):
         if transform:
             poly_geom.transform(transform)
 
-        for grid_feat in grid_layer.getFeatures():
+        # Geometria preparada: os predicados contra cada tile reutilizam os
+        # índices internos do GEOS em vez de recriá-los a cada teste
+        poly_engine = QgsGeometry.createGeometryEngine(poly_geom.constGet())
+        poly_engine.prepareGeometry()
+
+        poly_bbox = poly_geom.boundingBox()
+        poly_extent.combineExtentWith(poly_bbox)
+        polygons.append((poly_geom, poly_engine, poly_bbox))
+
+    if not polygons:
+        return []
+
+    # Lê da grade apenas os tiles na extensão dos polígonos e o campo 'tile_code'
+    request = QgsFeatureRequest()
+    request.setFilterRect(poly_extent)
+    request.setSubsetOfAttributes([tile_code_idx])
+
+    # Índice espacial da grade: cada polígono é testado apenas contra os
+    # tiles cujo retângulo envolvente intersecta o seu
+    grid_index, grid_features = build_grid_index(grid_layer, request=request)
+
+    tile_codes = set()
+
+    for _, poly_engine, poly_bbox in polygons:
+        for grid_id in grid_index.intersects(poly_bbox):
+            grid_feat = grid_features[grid_id]
             grid_geom = grid_feat.geometry()
-            if not grid_geom or grid_geom.isEmpty():
+
+            tile_code = grid_feat.attribute(tile_code_idx)
+
+            # Tile já encontrado para outro polígono: dispensa o teste
+            if tile_code in tile_codes:
                 continue
 
-            try:
-                tile_code = grid_feat["tile_code"]
-            except KeyError:
-                raise Exception("Campo 'tile_code' não encontrado na camada da grade")
-
-            if poly_geom.within(grid_geom):
-                results.append({
-                    "polygon_index": poly_feat.id(),
-                    "tile_code": tile_code,
-                    "relation": "within"
-                })
-            elif poly_geom.intersects(grid_geom):
-                results.append({
-                    "polygon_index": poly_feat.id(),
-                    "tile_code": tile_code,
-                    "relation": "intersects"
-                })
+            # 'within' implica 'intersects', então basta o segundo teste
+            if poly_engine.intersects(grid_geom.constGet()):
+                tile_codes.add(tile_code)
 
     # Retorna lista única e ordenada de códigos
-    unique_tile_codes = sorted(set(r["tile_code"] for r in results))
-    return unique_tile_codes
+    return sorted(tile_codes)
 
 
-def create_quadrant_dict(data: list[dict]) -> dict:
+def create_quadrant_dict(data: list[tuple]) -> dict:
     """
-    Transforms a list of data dictionaries into a dictionary keyed by quadrant code.
-    Each key holds a list of dictionaries for all files belonging to that quadrant.
+    Transforms a list of CSV rows into a dictionary keyed by quadrant code.
+    Each key holds a list of rows for all files belonging to that quadrant.
 
     Args:
-        data: A list of dictionaries (from the CSV file).
+        data: A list of named tuples (from the CSV file).
 
     Returns:
         A dictionary where keys are 'code' and values are lists
-        of dictionaries with the corresponding file information.
+        of rows with the corresponding file information.
     """
     # Using defaultdict simplifies grouping items by a key
     quadrants = defaultdict(list)
     
     for row in data:
         # Get the quadrant code from the current row
-        quadrant_code = row.get('code')
+        quadrant_code = row.code
         
         # If the code exists, append the entire row to the corresponding list
         if quadrant_code:
@@ -212,24 +305,35 @@ def create_quadrant_dict(data: list[dict]) -> dict:
     # Convert defaultdict back to a regular dict
     return dict(quadrants)
 
-def read_csv_file(filename: str) -> list[dict]:
+def read_csv_file(filename: str) -> list[tuple]:
     """
-    Reads a CSV file and returns the data as a list of dictionaries.
+    Reads a CSV file and returns the data as a list of named tuples.
 
     Args:
         filename: The path to the CSV file.
 
     Returns:
-        A list of dictionaries, where each dictionary represents a row.
+        A list of named tuples, where each tuple represents a row and its
+        fields are named after the header columns.
         Returns an empty list if the file is not found or an error occurs.
     """
     data = []
     try:
         with open(filename, mode='r', newline='', encoding='utf-8') as file:
-            # The DictReader reads each row as a dictionary using the header as keys.
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                data.append(row)
+            csv_reader = csv.reader(file)
+            header = next(csv_reader, None)
+            if header:
+                # A single row type built from the header avoids a dict per row.
+                Row = namedtuple('Row', [column.strip() for column in header])
+                width = len(header)
+                for row in csv_reader:
+                    # Skip blank lines; pad short rows with None and drop extra
+                    # columns, as DictReader used to do.
+                    if not row:
+                        continue
+                    if len(row) != width:
+                        row = (row + [None] * width)[:width]
+                    data.append(Row._make(row))
         print(f"File '{filename}' read successfully.")
     except FileNotFoundError:
         print(f"Error: The file '{filename}' was not found.")
@@ -239,19 +343,28 @@ def read_csv_file(filename: str) -> list[dict]:
 
 
 def find_missing_from_quadrant_dict(quadrant_dict: dict, codes: list[str], suffixes: list[str]) -> list[tuple[str, str]]:
-    # gerar todas as combinações esperadas
-    expected = set(product(codes, suffixes))
+    # remove duplicatas preservando a ordem
+    codes = list(dict.fromkeys(codes))
+    suffixes = list(dict.fromkeys(suffixes))
+
+    # cada sufixo corresponde a um bit da máscara de presença de um código
+    suffix_bits = {suffix: 1 << i for i, suffix in enumerate(suffixes)}
+    full_mask = (1 << len(suffixes)) - 1
+
+    missing = []
+    for code in codes:
+        present = 0
+        for item in quadrant_dict.get(code, ()):
+            present |= suffix_bits.get(item.suffix, 0)
 
-    # gerar todas as combinações existentes no dicionário
-    existing = set(
-        (code, item["suffix"])
-        for code, items in quadrant_dict.items()
-        for item in items
-    )
+        # percorre os bits ausentes, do menos ao mais significativo
+        gap = full_mask & ~present
+        while gap:
+            i = (gap & -gap).bit_length() - 1
+            missing.append((code, suffixes[i]))
+            gap &= gap - 1
 
-    # retornar o que está no esperado, mas não no existente
-    missing = expected - existing
-    return list(missing)
+    return missing
 
 def filter_quadrant_by_suffix(suffixes: list[str], unique_tile_codes: list[str], quadrant_dict: dict)-> dict:
     
@@ -262,25 +375,32 @@ def filter_quadrant_by_suffix(suffixes: list[str], unique_tile_codes: list[str],
     return quadrant_dict_filtered
         
 
-def filter_values_by_suffix(suffixes: list[str], data: list[dict]) -> list[dict]:
-    return [item for item in data if item.get('suffix') in suffixes]
+def filter_values_by_suffix(suffixes: list[str], data: list[tuple]) -> list[tuple]:
+    return [item for item in data if item.suffix in suffixes]
 
 
 def load_url_quadrants(quadrant_dict: dict)-> list[str]:
-    url = []
-    for quadrant_list in quadrant_dict.values():
-        for quadrant in quadrant_list:
-            url.append(f'{BASE_URL_TOPODATA}{quadrant['file_name']}')
-    return url
+    base_url = BASE_URL_TOPODATA
+    return [
+        base_url + quadrant.file_name
+        for quadrant_list in quadrant_dict.values()
+        for quadrant in quadrant_list
+    ]
 
 
 def find_tif(dir):
-    tifs = []
-    for root, _, files in os.walk(dir):
-        for file in files:
-            if file.lower().endswith('.tif') or file.lower().endswith('.tiff'):
-                tifs.append(os.path.join(root, file))
-    return tifs
+    """
+    Percorre o diretório recursivamente e gera os caminhos dos arquivos TIFF.
+    """
+    # os.scandir informa o tipo de cada entrada sem um stat adicional
+    stack = [dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(('.tif', '.tiff')):
+                    yield entry.path
 
 
 def add_layers(tifs):
@@ -307,10 +427,18 @@ def test_polygon_grid_intersection(polygon_path, grid_path):
         return
 
     # Ajusta CRS
-    if poly_layer.crs() != grid_layer.crs():
-        transform = QgsCoordinateTransform(poly_layer.crs(), grid_layer.crs(), QgsProject.instance())
-    else:
-        transform = None
+    transform = crs_transform(poly_layer.crs(), grid_layer.crs())
+
+    tile_code_idx = grid_layer.fields().indexOf("tile_code")
+    if tile_code_idx < 0:
+        print("Campo 'tile_code' não encontrado")
+        return
+
+    request = QgsFeatureRequest()
+    request.setFilterRect(extent_in_crs(poly_layer, grid_layer.crs()))
+    request.setSubsetOfAttributes([tile_code_idx])
+
+    grid_index, grid_features = build_grid_index(grid_layer, request=request)
 
     for poly_feat in poly_layer.getFeatures():
         poly_geom = poly_feat.geometry()
@@ -322,23 +450,22 @@ def test_polygon_grid_intersection(polygon_path, grid_path):
             poly_geom = poly_geom.clone()
             poly_geom.transform(transform)
 
+        poly_engine = QgsGeometry.createGeometryEngine(poly_geom.constGet())
+        poly_engine.prepareGeometry()
+
         found_tiles = []
 
-        for grid_feat in grid_layer.getFeatures():
+        for grid_id in grid_index.intersects(poly_geom.boundingBox()):
+            grid_feat = grid_features[grid_id]
             grid_geom = grid_feat.geometry()
-            if not grid_geom or grid_geom.isEmpty():
-                continue
 
-            tile_code = grid_feat["tile_code"] if "tile_code" in grid_feat.fields().names() else None
-            if tile_code is None:
-                print("Campo 'tile_code' não encontrado")
-                return
+            tile_code = grid_feat.attribute(tile_code_idx)
 
             # Testa contenção e interseção
-            if poly_geom.within(grid_geom):
+            if poly_engine.within(grid_geom.constGet()):
                 print(f"Polígono {poly_feat.id()} está DENTRO do tile {tile_code}")
                 found_tiles.append(tile_code)
-            elif poly_geom.intersects(grid_geom):
+            elif poly_engine.intersects(grid_geom.constGet()):
                 print(f"Polígono {poly_feat.id()} INTERSECTA tile {tile_code}")
                 found_tiles.append(tile_code)
 
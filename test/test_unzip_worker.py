@@ -0,0 +1,110 @@
+# coding=utf-8
+"""UnzipWorker test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'markus.scheid.anater@gmail.com'
+__date__ = '2025-07-31'
+__copyright__ = 'Copyright 2025, Markus Scheid Anater'
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zipfile
+
+from unzip_worker import UnzipWorker
+
+# Campo extra no formato (id, tamanho, dados) aceito pelo zipfile
+EXTRA_FIELD = struct.pack('<HH', 0xCAFE, 4) + b'test'
+
+
+class UnzipWorkerTest(unittest.TestCase):
+    """Test extraction of TIF members from ZIP files."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dir_path = tempfile.mkdtemp()
+        self.payload = bytes(range(256)) * 4096
+        self.errors = []
+        self.unzip_files = []
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+    def make_stored_zip(self, extra=b''):
+        """Creates a ZIP with a STORED .tif member and returns its path."""
+        zip_path = os.path.join(self.dir_path, 'tile.zip')
+        info = zipfile.ZipInfo('folder/tile.tif')
+        info.compress_type = zipfile.ZIP_STORED
+        info.extra = extra
+        with zipfile.ZipFile(zip_path, 'w') as zip_ref:
+            zip_ref.writestr('readme.txt', 'not a tif')
+            zip_ref.writestr(info, self.payload)
+        return zip_path
+
+    def run_worker(self, *zip_paths):
+        worker = UnzipWorker(self.dir_path, list(zip_paths))
+        worker.error.connect(self.errors.append)
+        worker.finished.connect(self.unzip_files.extend)
+        worker.start()
+
+    def test_stored_member_with_extra_field(self):
+        """Test STORED data is read after the local header's extra field."""
+        self.run_worker(self.make_stored_zip(extra=EXTRA_FIELD))
+
+        dest_path = os.path.join(self.dir_path, 'tile.tif')
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.unzip_files, [dest_path])
+        with open(dest_path, 'rb') as tif:
+            self.assertEqual(tif.read(), self.payload)
+
+    def test_corrupted_stored_member(self):
+        """Test a STORED member with a wrong CRC-32 is reported as corrupted."""
+        zip_path = self.make_stored_zip()
+        with open(zip_path, 'r+b') as zip_file:
+            content = zip_file.read()
+            offset = content.index(self.payload) + len(self.payload) // 2
+            zip_file.seek(offset)
+            zip_file.write(bytes([content[offset] ^ 0xFF]))
+
+        self.run_worker(zip_path)
+
+        self.assertEqual(self.unzip_files, [])
+        self.assertEqual(len(self.errors), 1)
+        self.assertIn('corrompido', self.errors[0])
+        self.assertFalse(os.path.exists(os.path.join(self.dir_path, 'tile.tif')))
+
+    def test_results_follow_zip_order(self):
+        """Test finished lists TIFs, and resolves name clashes, in ZIP order."""
+        zip_paths = []
+        for index, size in enumerate([4 << 20, 1, 2 << 20]):
+            zip_path = os.path.join(self.dir_path, f'tile_{index}.zip')
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+                zip_ref.writestr('tile.tif', bytes([index]) * size)
+            zip_paths.append(zip_path)
+
+        self.run_worker(*zip_paths)
+
+        expected = [
+            os.path.join(self.dir_path, name)
+            for name in ('tile.tif', 'tile_1.tif', 'tile_2.tif')
+        ]
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.unzip_files, expected)
+        for index, dest_path in enumerate(expected):
+            with open(dest_path, 'rb') as tif:
+                self.assertEqual(tif.read(1), bytes([index]))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(UnzipWorkerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
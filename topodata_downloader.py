@@ -350,18 +350,13 @@ class TopodataDownloader:
         self._log_message(f"Baixando arquivo {index + 1}/{self.total_urls}: {filename}")
         # A barra de progresso será atualizada continuamente pelo sinal de progresso do arquivo
 
-    def on_download_progress_file(self, bytes_received, bytes_total):
+    def on_download_progress_file(self, current, total):
         """
-        Atualiza a barra de progresso com o progresso do arquivo atual.
+        Atualiza a barra de progresso com o progresso do lote de downloads,
+        já agregado pelo DownloadWorker sobre os arquivos concluídos e em andamento.
         """
-        if bytes_total > 0 and self.total_urls > 0:
-            # Calcula a base do progresso com base nos arquivos já concluídos
-            base_progress = (self.completed_downloads / self.total_urls) * 100
-            # Calcula o progresso do arquivo atual em relação ao total
-            current_file_progress = (bytes_received / bytes_total) * (100 / self.total_urls)
-            
-            total_progress = int(base_progress + current_file_progress)
-            self.dlg.progressBar.setValue(total_progress)
+        if total > 0:
+            self.dlg.progressBar.setValue(int((current / total) * 100))
             
     def on_download_file_finished(self):
         """
@@ -8,11 +8,24 @@ Este programa é distribuído sob a licença GNU GPL v2 ou posterior.
 """
 
 from PyQt5.QtCore import QObject, pyqtSignal
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-import tempfile
 import zipfile
 import shutil
 
+# Tamanho do buffer usado na cópia dos membros do ZIP para o disco (1 MiB)
+COPY_BUFFER_SIZE = 1 << 20
+
+# Número máximo de ZIPs extraídos simultaneamente
+MAX_UNZIP_WORKERS = min(8, os.cpu_count() or 1)
+
+def name_key(name):
+    """
+    Normaliza um nome de arquivo para comparação, ignorando maiúsculas e
+    minúsculas como os sistemas de arquivos do Windows e do macOS.
+    """
+    return os.path.normcase(name).lower()
+
 class UnzipWorker(QObject):
     started = pyqtSignal(str)
     progress = pyqtSignal(int, int)
@@ -27,86 +40,121 @@ class UnzipWorker(QObject):
         self.total_files = len(self.zip_files)
         self.current_index = 0
         self.unzip_files = []
+        # Nomes já ocupados no diretório de destino, consultados em O(1)
+        existing = os.listdir(self.unzip_dir_path) if os.path.isdir(self.unzip_dir_path) else []
+        self._used_names = {name_key(name) for name in existing}
 
     def start(self):
         """Inicia o processo de descompactação."""
         self.started.emit(f"Descompactando {self.total_files} arquivos ZIP...")
-        self.unzip_next()
+        self.unzip_all()
 
-    def unzip_next(self):
-        """Orquestra o processo de descompactação."""
-        if self.current_index >= self.total_files:
-            self.finished.emit(self.unzip_files)
-            return
+    def unzip_all(self):
+        """
+        Orquestra o processo de descompactação, extraindo os ZIPs em paralelo.
+        A descompressão (zlib) libera o GIL, permitindo sobrepor o uso de CPU
+        de um arquivo à escrita em disco de outro.
 
-        zip_file_path = self.zip_files[self.current_index]
-        
+        Os nomes de destino são reservados antes, na ordem de self.zip_files,
+        e a lista emitida em finished segue essa mesma ordem, independente da
+        ordem em que as extrações terminam.
+        """
+        results = {}
+        plans = {}
+        for zip_file_path in self.zip_files:
+            try:
+                plans[zip_file_path] = self.plan_tif_files(zip_file_path)
+            except Exception as e:
+                self.handle_error(zip_file_path, e)
+                self.update_progress()
+
+        if plans:
+            max_workers = min(MAX_UNZIP_WORKERS, len(plans))
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = {
+                    pool.submit(self.extract_tif_files, zip_file_path, members): zip_file_path
+                    for zip_file_path, members in plans.items()
+                }
+                for future in as_completed(futures):
+                    zip_file_path = futures[future]
+                    results[zip_file_path] = self.handle_result(zip_file_path, future)
+
+        for zip_file_path in self.zip_files:
+            self.unzip_files.extend(results.get(zip_file_path, []))
+
+        self.finished.emit(self.unzip_files)
+
+    def handle_result(self, zip_file_path, future):
+        """
+        Trata o resultado da extração de um ZIP, atualiza o progresso e
+        retorna os TIFs extraídos.
+        """
+        tif_files = []
         try:
-            temp_dir = self.create_temp_dir()
-            self.extract_zip(zip_file_path, temp_dir)
-            tif_files = self.find_tif_files(temp_dir)
+            tif_files = future.result()
             
-            if tif_files:
-                self.move_tif_files(tif_files)
-            else:
+            if not tif_files:
                 self.emit_tif_warning(zip_file_path)
-                
-            self.cleanup_temp_dir(temp_dir)
             
-        except zipfile.BadZipFile:
-            self.emit_corrupted_error(zip_file_path)
         except Exception as e:
-            self.emit_generic_error(zip_file_path, e)
+            self.handle_error(zip_file_path, e)
         finally:
             self.update_progress()
+        return tif_files
 
-    def create_temp_dir(self):
-        """Cria diretório temporário para extração."""
-        temp_dir = tempfile.mkdtemp(dir=self.unzip_dir_path)
-        return temp_dir
+    def handle_error(self, zip_file_path, exception):
+        """Notifica o erro ocorrido ao processar um ZIP."""
+        if isinstance(exception, zipfile.BadZipFile):
+            self.emit_corrupted_error(zip_file_path)
+        else:
+            self.emit_generic_error(zip_file_path, exception)
 
-    def extract_zip(self, zip_path, extract_dir):
-        """Descompacta arquivo ZIP para diretório especificado."""
+    def plan_tif_files(self, zip_path):
+        """
+        Lista os membros .tif do ZIP e reserva o caminho de destino de cada um.
+        Retorna lista de tuplas (membro, caminho de destino).
+        """
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+            return [
+                (info, self.resolve_dest_path(os.path.basename(info.filename)))
+                for info in zip_ref.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".tif")
+            ]
 
-    def find_tif_files(self, path):
+    def extract_tif_files(self, zip_path, members):
         """
-        Encontra todos os arquivos .tif no caminho especificado.
+        Extrai os membros .tif planejados diretamente para o diretório base.
         Retorna lista de caminhos absolutos.
         """
         tif_files = []
-        if os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                for file in files:
-                    if file.lower().endswith(".tif"):
-                        full_path = os.path.join(root, file)
-                        tif_files.append(full_path)
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for info, dest_path in members:
+                try:
+                    with zip_ref.open(info) as src, open(dest_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+                except Exception:
+                    # Não deixa arquivos parciais no diretório de destino
+                    if os.path.exists(dest_path):
+                        os.remove(dest_path)
+                    raise
+                tif_files.append(dest_path)
         return tif_files
 
-    def move_tif_files(self, tif_files):
-        """Move arquivos TIF para o diretório base."""
-        for tif_file in tif_files:
-            filename = os.path.basename(tif_file)
-            dest_path = os.path.join(self.unzip_dir_path, filename)
-            
-            self.unzip_files.append(dest_path)
-
-            # Evita sobrescrita de arquivos
-            counter = 1
-            while os.path.exists(dest_path):
-                name, ext = os.path.splitext(filename)
-                dest_path = os.path.join(
-                    self.unzip_dir_path, 
-                    f"{name}_{counter}{ext}"
-                )
-                counter += 1
-                
-            shutil.move(tif_file, dest_path)
-
-    def cleanup_temp_dir(self, temp_dir):
-        """Remove diretório temporário e seu conteúdo."""
-        shutil.rmtree(temp_dir, ignore_errors=True)
+    def resolve_dest_path(self, filename):
+        """
+        Retorna o caminho de destino de um TIF, evitando sobrescrita de arquivos,
+        e reserva o nome escolhido.
+        """
+        dest_name = filename
+
+        counter = 1
+        name, ext = os.path.splitext(filename)
+        while name_key(dest_name) in self._used_names:
+            dest_name = f"{name}_{counter}{ext}"
+            counter += 1
+
+        self._used_names.add(name_key(dest_name))
+        return os.path.join(self.unzip_dir_path, dest_name)
 
     def emit_tif_warning(self, zip_path):
         """Notifica ausência de arquivos TIF."""
@@ -124,7 +172,6 @@ class UnzipWorker(QObject):
         self.error.emit(err_msg)
 
     def update_progress(self):
-        """Atualiza progresso e avança para próximo item."""
+        """Atualiza o progresso após a conclusão de um item."""
         self.current_index += 1
         self.progress.emit(self.current_index, self.total_files)
-        self.unzip_next()
\ No newline at end of file